@@ -1,20 +1,12 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import numpy as np
 from datetime import datetime, timedelta
+from typing import NamedTuple
 import sys
 import os
 
-# PDF 보고서 생성 모듈 import
-try:
-    from report_generator import generate_pdf_report
-    PDF_AVAILABLE = True
-except ImportError as e:
-    PDF_AVAILABLE = False
-    print(f"PDF 생성 모듈 로드 실패: {e}")
+# plotly와 PDF 보고서 생성 모듈(report_generator)은 무거우므로 사용하는 곳에서 import
 
 # 페이지 설정
 st.set_page_config(
@@ -24,15 +16,23 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# 캐시를 사용하여 데이터 로딩 최적화
-@st.cache_data
-def load_data():
-    """지하철 혼잡도 데이터 로딩"""
+# 현재 파일 위치 기준 CSV 경로
+CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'SM_CrowdInfo.csv')
+
+def get_file_signature(path):
+    """파일 수정 시각과 크기 (파일이 없으면 None, None)"""
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime, stat.st_size
+    except OSError:
+        return None, None
+
+# 캐시를 사용하여 데이터 로딩 최적화 (디스크에 저장해 서버 재시작 후에도 재사용)
+# 파일 수정 시각/크기가 캐시 키에 포함되므로 CSV가 바뀌면 다시 읽음
+@st.cache_data(persist="disk")
+def load_data(csv_path=CSV_PATH, file_mtime=None, file_size=None):
+    """지하철 혼잡도 데이터 로딩 (file_mtime, file_size는 캐시 키 용도)"""
     try:
-        # 현재 파일 위치 기준으로 CSV 경로 설정
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        csv_path = os.path.join(current_dir, 'SM_CrowdInfo.csv')
-        
         # EUC-KR 또는 CP949 인코딩으로 읽기
         df = pd.read_csv(csv_path, encoding='cp949')
         
@@ -44,7 +44,21 @@ def load_data():
         st.error(f"데이터 로딩 중 오류 발생: {e}")
         return None
 
-@st.cache_data
+class CrowdData(NamedTuple):
+    """전처리 결과 (탭 렌더링 함수에 하나로 전달)"""
+    df: pd.DataFrame
+    time_columns: list         # 시각 순으로 정렬된 시간대 컬럼명
+    info_columns: list         # 기본 정보 컬럼명
+    time_matrix: np.ndarray    # 행 x 시간대 혼잡도 (float32)
+    row_index: dict            # (역명, 요일구분) -> 행 번호
+    time_idx: dict             # 시간대 컬럼명 -> 열 번호
+    time_minutes: np.ndarray   # 시간대별 분 단위 값 (정렬됨)
+    morning_idx: np.ndarray    # 출근 시간대 열 번호
+    evening_idx: np.ndarray    # 퇴근 시간대 열 번호
+    uniques: dict              # 선택 위젯용 컬럼별 고유값 목록
+    station_names: np.ndarray  # 역명 검색용 소문자 역명 배열
+
+@st.cache_data(persist="disk")
 def preprocess_data(df):
     """데이터 전처리 및 변환"""
     if df is None:
@@ -60,7 +74,54 @@ def preprocess_data(df):
     for col in time_columns:
         df[col] = pd.to_numeric(df[col].astype(str).str.strip(), errors='coerce')
     
-    return df, time_columns, info_columns
+    # 혼잡도는 소수 첫째 자리 백분율이므로 float32로 충분 (메모리/대역폭 절반)
+    df[time_columns] = df[time_columns].astype(np.float32)
+    
+    # 문자열 정보 컬럼은 category로 변환 (필터 비교가 정수 코드 비교가 됨)
+    # categories는 데이터 등장 순서를 유지하여 라디오 버튼 순서로 그대로 사용
+    for col in info_columns:
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = pd.Categorical(df[col], categories=df[col].dropna().unique())
+    
+    # 시간대 컬럼을 분 단위 시각 순으로 한 번 정렬 (CSV 컬럼 순서에 의존하지 않도록)
+    time_minutes = np.array([parse_time_to_minutes(col) for col in time_columns], dtype=np.int32)
+    order = np.argsort(time_minutes, kind='stable')
+    time_columns = [time_columns[i] for i in order]
+    time_minutes = time_minutes[order]
+    
+    # 시간대 컬럼명 -> 열 번호 (정렬된 순서 기준)
+    time_idx = {col: i for i, col in enumerate(time_columns)}
+    
+    # 역 x 시간대 혼잡도 행렬 (탭마다 DataFrame을 다시 스캔하지 않도록 한 번만 생성)
+    time_matrix = df[time_columns].to_numpy(dtype=np.float32, copy=True)
+    
+    # (역명, 요일구분) -> 행 번호 (중복 시 기존 .iloc[0]과 같이 첫 번째 행 사용)
+    row_index = {}
+    for i, key in enumerate(zip(df[info_columns[3]], df[info_columns[4]])):
+        row_index.setdefault(key, i)
+    
+    # 출퇴근 시간대 열 번호 (시간 형식이 '07시'가 아니라 '7시')
+    morning_idx = np.array([i for i, col in enumerate(time_columns)
+                            if col.startswith(('7시', '8시', '9시'))], dtype=np.intp)
+    evening_idx = np.array([i for i, col in enumerate(time_columns)
+                            if col.startswith(('18시', '19시', '20시'))], dtype=np.intp)
+    
+    # 선택 위젯용 고유값 목록, 역명 검색용 소문자 역명 배열
+    uniques = get_uniques(df, info_columns)
+    station_names = np.char.lower(df[info_columns[3]].to_numpy(dtype=str))
+    
+    return CrowdData(df, time_columns, info_columns, time_matrix, row_index, time_idx, time_minutes,
+                     morning_idx, evening_idx, uniques, station_names)
+
+def get_uniques(df, info_columns):
+    """정보 컬럼별 정렬된 고유값 목록 (category 컬럼은 categories를 그대로 정렬)"""
+    uniques = {}
+    for col in info_columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            uniques[col] = sorted(df[col].cat.categories.tolist())
+        else:
+            uniques[col] = sorted(df[col].unique().tolist())
+    return uniques
 
 def get_line_color(line_name):
     """호선별 색상 매핑"""
@@ -94,7 +155,7 @@ def parse_time_to_minutes(time_str):
     except:
         return 0
 
-def get_current_time_slot(time_columns):
+def get_current_time_slot(time_columns, time_minutes):
     """현재 시간에 가장 가까운 시간대 찾기"""
     now = datetime.now()
     current_minutes = now.hour * 60 + now.minute
@@ -103,43 +164,30 @@ def get_current_time_slot(time_columns):
     if current_minutes < 5 * 60:  # 5시 이전
         current_minutes += 24 * 60
     
-    min_diff = float('inf')
-    closest_time = time_columns[0]
-    
-    for time_col in time_columns:
-        time_minutes = parse_time_to_minutes(time_col)
-        diff = abs(time_minutes - current_minutes)
-        if diff < min_diff:
-            min_diff = diff
-            closest_time = time_col
-    
-    return closest_time
+    # time_minutes는 정렬되어 있으므로 이진 탐색 후 양옆 슬롯 중 가까운 쪽 선택 (같으면 이른 쪽)
+    pos = int(np.searchsorted(time_minutes, current_minutes))
+    if pos == len(time_minutes) or (
+            pos > 0 and current_minutes - time_minutes[pos - 1] <= time_minutes[pos] - current_minutes):
+        pos -= 1
+    return time_columns[pos]
 
-def find_better_times(station_data, time_columns, current_time, threshold=20):
-    """현재 시간보다 덜 혼잡한 시간대 찾기"""
-    current_congestion = station_data[current_time]
-    better_times = []
-    
-    current_idx = time_columns.index(current_time)
+def find_better_times(row_vec, time_columns, current_idx, threshold=20):
+    """현재 시간보다 덜 혼잡한 시간대 찾기 (row_vec: 한 역의 시간대별 혼잡도 배열)
     
+    반환값: (시간, 혼잡도, 차이, 시간차) 배열 튜플 - 차이가 큰 순서
+    """
     # 전후 2시간 범위 내에서 검색 (4개 슬롯)
-    for i in range(max(0, current_idx - 4), min(len(time_columns), current_idx + 5)):
-        if i == current_idx:
-            continue
-        
-        time_col = time_columns[i]
-        congestion = station_data[time_col]
-        
-        if congestion < current_congestion - threshold:
-            time_diff = (i - current_idx) * 30  # 30분 단위
-            better_times.append({
-                '시간': time_col,
-                '혼잡도': congestion,
-                '차이': current_congestion - congestion,
-                '시간차': time_diff
-            })
-    
-    return sorted(better_times, key=lambda x: x['차이'], reverse=True)
+    lo, hi = max(0, current_idx - 4), min(len(row_vec), current_idx + 5)
+    diffs = row_vec[current_idx] - row_vec[lo:hi]
+    
+    # 현재 시간대는 차이가 0이므로 자동으로 제외됨
+    candidates = np.nonzero(diffs > threshold)[0]
+    order = candidates[np.argsort(-diffs[candidates], kind='stable')]
+    idx = lo + order
+    
+    times = [time_columns[i] for i in idx]
+    time_diffs = (idx - current_idx) * 30  # 30분 단위
+    return times, row_vec[idx], diffs[order], time_diffs
 
 def main():
     st.title("🚇 서울 지하철 혼잡도 대시보드")
@@ -147,13 +195,14 @@ def main():
     
     # 데이터 로딩
     with st.spinner("데이터를 불러오는 중..."):
-        df = load_data()
+        df = load_data(CSV_PATH, *get_file_signature(CSV_PATH))
         
         if df is None:
+            load_data.clear()  # 실패 결과가 디스크 캐시에 남지 않도록 제거
             st.error("데이터를 불러올 수 없습니다.")
             return
         
-        df, time_columns, info_columns = preprocess_data(df)
+        data = preprocess_data(df)
     
     # 탭 생성
     tab1, tab2, tab3, tab4, tab5 = st.tabs([
@@ -166,60 +215,58 @@ def main():
     
     # 탭 1: 전체 대시보드 (기존 코드)
     with tab1:
-        render_main_dashboard(df, time_columns, info_columns)
+        render_main_dashboard(data)
     
     # 탭 2: 나의 출퇴근 시간 맞춤 분석
     with tab2:
-        render_commute_analysis(df, time_columns, info_columns)
+        render_commute_analysis(data)
     
     # 탭 3: 역 비교 기능
     with tab3:
-        render_station_comparison(df, time_columns, info_columns)
+        render_station_comparison(data)
     
     # 탭 4: 지금 타기 좋은 시간
     with tab4:
-        render_best_time_now(df, time_columns, info_columns)
+        render_best_time_now(data)
     
     # 탭 5: 상행선/하행선 방향별 분석
     with tab5:
-        render_direction_analysis(df, time_columns, info_columns)
+        render_direction_analysis(data)
     
     # 사이드바에 PDF 보고서 생성 버튼 추가
     st.sidebar.markdown("---")
     st.sidebar.header("📄 보고서 생성")
     
-    if PDF_AVAILABLE:
-        if st.sidebar.button("🎯 PDF 보고서 생성", width='stretch'):
-            with st.spinner("📊 보고서를 생성하는 중..."):
-                try:
-                    # 폰트 정보 출력 (디버깅용)
-                    import report_generator
-                    st.sidebar.info(f"사용 중인 폰트: {report_generator.KOREAN_FONT}")
-                    
-                    # PDF 생성
-                    pdf_buffer = generate_pdf_report(df, time_columns, info_columns)
-                    
-                    # 다운로드 버튼
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    filename = f"지하철혼잡도보고서_{timestamp}.pdf"
-                    
-                    st.sidebar.download_button(
-                        label="📥 보고서 다운로드",
-                        data=pdf_buffer,
-                        file_name=filename,
-                        mime="application/pdf",
-                        width='stretch'
-                    )
-                    
-                    st.sidebar.success("✅ 보고서 생성 완료!")
-                    st.sidebar.info(f"파일명: {filename}")
-                    
-                except Exception as e:
-                    st.sidebar.error(f"❌ 보고서 생성 중 오류 발생: {e}")
-                    st.sidebar.info("누락된 패키지를 설치해주세요:\npip install reportlab kaleido Pillow")
-    else:
-        st.sidebar.warning("⚠️ PDF 생성 기능을 사용하려면 추가 패키지 설치가 필요합니다.")
-        st.sidebar.code("pip install reportlab kaleido Pillow", language="bash")
+    if st.sidebar.button("🎯 PDF 보고서 생성", width='stretch'):
+        with st.spinner("📊 보고서를 생성하는 중..."):
+            try:
+                # 버튼을 눌렀을 때만 import (설치되지 않은 경우 아래 except에서 안내)
+                import report_generator
+                
+                # 폰트 정보 출력 (디버깅용)
+                st.sidebar.info(f"사용 중인 폰트: {report_generator.KOREAN_FONT}")
+                
+                # PDF 생성
+                pdf_buffer = report_generator.generate_pdf_report(data.df, data.time_columns, data.info_columns)
+                
+                # 다운로드 버튼
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                filename = f"지하철혼잡도보고서_{timestamp}.pdf"
+                
+                st.sidebar.download_button(
+                    label="📥 보고서 다운로드",
+                    data=pdf_buffer,
+                    file_name=filename,
+                    mime="application/pdf",
+                    width='stretch'
+                )
+                
+                st.sidebar.success("✅ 보고서 생성 완료!")
+                st.sidebar.info(f"파일명: {filename}")
+                
+            except Exception as e:
+                st.sidebar.error(f"❌ 보고서 생성 중 오류 발생: {e}")
+                st.sidebar.info("누락된 패키지를 설치해주세요:\npip install reportlab matplotlib Pillow")
     
     # 보고서 정보
     with st.sidebar.expander("ℹ️ 보고서 정보"):
@@ -235,59 +282,72 @@ def main():
         **생성 시간:** 약 5-10초
         """)
 
-def render_main_dashboard(df, time_columns, info_columns):
+def render_main_dashboard(data):
     """전체 대시보드 렌더링 (기존 메인 화면)"""
+    import plotly.graph_objects as go
+    
+    # 전처리 결과에서 사용하는 값
+    df, time_columns, info_columns = data.df, data.time_columns, data.info_columns
+    time_matrix, uniques, station_names = data.time_matrix, data.uniques, data.station_names
+    
     # 사이드바 - 필터링 옵션
     st.sidebar.header("🔍 필터 옵션")
     
     # 운영기관 선택
-    operators = sorted(df[info_columns[0]].unique())
+    operators = uniques[info_columns[0]]
     selected_operator = st.sidebar.selectbox("운영기관", ["전체"] + operators)
     
     # 호선 선택
     if selected_operator != "전체":
         lines = sorted(df[df[info_columns[0]] == selected_operator][info_columns[1]].unique())
     else:
-        lines = sorted(df[info_columns[1]].unique())
+        lines = uniques[info_columns[1]]
     selected_line = st.sidebar.selectbox("호선", ["전체"] + list(lines))
     
     # 요일 선택
-    day_types = sorted(df[info_columns[4]].unique())
+    day_types = uniques[info_columns[4]]
     selected_day = st.sidebar.selectbox("요일 구분", ["전체"] + list(day_types))
     
     # 역명 검색
     station_search = st.sidebar.text_input("역명 검색", "")
     
-    # 데이터 필터링
-    filtered_df = df.copy()
+    # 데이터 필터링 (조건을 하나의 마스크로 모은 뒤 한 번만 추출)
+    mask = np.ones(len(df), dtype=bool)
     
     if selected_operator != "전체":
-        filtered_df = filtered_df[filtered_df[info_columns[0]] == selected_operator]
+        mask &= (df[info_columns[0]] == selected_operator).to_numpy()
     
     if selected_line != "전체":
-        filtered_df = filtered_df[filtered_df[info_columns[1]] == selected_line]
+        mask &= (df[info_columns[1]] == selected_line).to_numpy()
     
     if selected_day != "전체":
-        filtered_df = filtered_df[filtered_df[info_columns[4]] == selected_day]
+        mask &= (df[info_columns[4]] == selected_day).to_numpy()
     
     if station_search:
-        filtered_df = filtered_df[filtered_df[info_columns[3]].str.contains(station_search, na=False)]
+        # 미리 만든 소문자 역명 배열에서 부분 문자열 검색 (정규식 엔진을 거치지 않음)
+        mask &= np.char.find(station_names, station_search.lower()) >= 0
+    
+    filtered_df = df[mask]
     
     # 메인 대시보드
     if len(filtered_df) == 0:
         st.warning("선택한 조건에 맞는 데이터가 없습니다.")
         return
     
+    # 필터 결과의 혼잡도 행렬 (통계, 히트맵, TOP 10에서 공통으로 사용)
+    congestion_values = time_matrix[mask]
+    col_means = np.nanmean(congestion_values, axis=0)
+    
     # 주요 통계
     st.header("📊 주요 통계")
     col1, col2, col3, col4 = st.columns(4)
     
     # 전체 평균 혼잡도
-    avg_congestion = filtered_df[time_columns].mean().mean()
+    avg_congestion = col_means.mean()
     col1.metric("평균 혼잡도", f"{avg_congestion:.1f}%")
     
     # 최대 혼잡도
-    max_congestion = filtered_df[time_columns].max().max()
+    max_congestion = np.nanmax(congestion_values)
     col2.metric("최대 혼잡도", f"{max_congestion:.1f}%")
     
     # 역 개수
@@ -295,8 +355,7 @@ def render_main_dashboard(df, time_columns, info_columns):
     col3.metric("역 개수", f"{station_count}개")
     
     # 가장 혼잡한 시간대
-    avg_by_time = filtered_df[time_columns].mean()
-    peak_time = avg_by_time.idxmax()
+    peak_time = time_columns[int(np.nanargmax(col_means))]
     col4.metric("피크 시간대", peak_time)
     
     st.markdown("---")
@@ -304,74 +363,70 @@ def render_main_dashboard(df, time_columns, info_columns):
     # 시간대별 평균 혼잡도
     st.header("⏰ 시간대별 평균 혼잡도")
     
-    avg_by_time_df = pd.DataFrame({
-        '시간': time_columns,
-        '평균 혼잡도': [filtered_df[col].mean() for col in time_columns]
-    })
-    
-    fig_line = px.line(
-        avg_by_time_df,
-        x='시간',
-        y='평균 혼잡도',
-        title='시간대별 평균 혼잡도 추이',
-        markers=True
-    )
+    # 주요 통계에서 계산한 시간대별 평균 재사용
+    fig_line = go.Figure(go.Scatter(
+        x=time_columns,
+        y=col_means,
+        mode='lines+markers',
+        line=dict(color='#FF6B6B', width=3)
+    ))
     fig_line.update_layout(
+        title='시간대별 평균 혼잡도 추이',
+        xaxis_title='시간',
+        yaxis_title='평균 혼잡도',
         xaxis_tickangle=-45,
         height=400,
         hovermode='x unified'
     )
-    fig_line.update_traces(line_color='#FF6B6B', line_width=3)
     st.plotly_chart(fig_line, width='stretch')
     
     # 평일/주말 비교
     if '전체' in [selected_day] or selected_day == "전체":
         st.header("📅 평일/주말 혼잡도 비교")
         
-        comparison_data = []
-        for day_type in day_types:
-            day_df = filtered_df[filtered_df[info_columns[4]] == day_type]
-            for col in time_columns:
-                comparison_data.append({
-                    '시간': col,
-                    '요일구분': day_type,
-                    '평균 혼잡도': day_df[col].mean()
-                })
-        
-        comparison_df = pd.DataFrame(comparison_data)
+        # 요일구분별 시간대 평균을 한 번에 계산 (필터 결과에 없는 요일도 유지)
+        day_avg = filtered_df.groupby(info_columns[4], observed=True)[time_columns].mean().reindex(day_types)
         
-        fig_comparison = px.line(
-            comparison_df,
-            x='시간',
-            y='평균 혼잡도',
-            color='요일구분',
+        traces = [
+            go.Scatter(x=time_columns, y=day_values, mode='lines+markers', name=day_type)
+            for day_type, day_values in zip(day_avg.index, day_avg.to_numpy())
+        ]
+        fig_comparison = go.Figure(data=traces, layout=go.Layout(
             title='평일/주말 혼잡도 비교',
-            markers=True
-        )
-        fig_comparison.update_layout(
+            xaxis_title='시간',
+            yaxis_title='평균 혼잡도',
+            legend_title_text='요일구분',
             xaxis_tickangle=-45,
             height=400,
             hovermode='x unified'
-        )
+        ))
         st.plotly_chart(fig_comparison, width='stretch')
     
     # 역별 혼잡도 히트맵
     st.header("🗺️ 역별 혼잡도 히트맵")
     
-    # 상위 20개 역만 표시 (너무 많으면 시각화가 어려움)
-    top_stations = filtered_df.nlargest(20, time_columns, keep='first')
-    
-    heatmap_data = top_stations[time_columns].values
-    station_labels = [f"{row[info_columns[3]]} ({row[info_columns[4]]})" 
-                     for _, row in top_stations.iterrows()]
-    
+    # 상위 20개 역만 표시 (너무 많으면 시각화가 어려움) - 역별 최대 혼잡도 기준
+    # 빈 칸(NaN)은 -inf로 채워 행별 최대값/최대 시간대 계산에서 제외 (값이 하나도 없는 행은 NaN으로 맨 뒤)
+    filled = np.where(np.isnan(congestion_values), -np.inf, congestion_values)
+    row_argmax = filled.argmax(axis=1)
+    row_max = filled.max(axis=1)
+    row_max[np.isneginf(row_max)] = np.nan
+    # 안정 정렬로 동점은 앞 행 우선 (nlargest(keep='first')와 동일)
+    top_idx = np.argsort(-row_max, kind='stable')[:20]
+    top_stations = filtered_df.iloc[top_idx]
+    
+    heatmap_data = congestion_values[top_idx]
+    station_labels = [f"{station} ({direction})" 
+                     for station, direction in top_stations[[info_columns[3], info_columns[4]]]
+                     .itertuples(index=False, name=None)]
+    
+    # 셀 라벨은 z 값을 그대로 사용 (같은 행렬을 text로 한 번 더 보내지 않음)
     fig_heatmap = go.Figure(data=go.Heatmap(
         z=heatmap_data,
         x=time_columns,
         y=station_labels,
         colorscale='RdYlGn_r',
-        text=heatmap_data,
-        texttemplate='%{text:.1f}',
+        texttemplate='%{z:.1f}',
         textfont={"size": 8},
         colorbar=dict(title="혼잡도(%)")
     ))
@@ -389,21 +444,18 @@ def render_main_dashboard(df, time_columns, info_columns):
     # 상위 혼잡 역 목록
     st.header("🏆 가장 혼잡한 역 TOP 10")
     
-    station_max_congestion = []
-    for _, row in filtered_df.iterrows():
-        max_val = row[time_columns].max()
-        max_time = row[time_columns].idxmax()
-        station_max_congestion.append({
-            '운영기관': row[info_columns[0]],
-            '호선': row[info_columns[1]],
-            '역명': row[info_columns[3]],
-            '요일구분': row[info_columns[4]],
-            '최대 혼잡도': max_val,
-            '최대 혼잡 시간': max_time
-        })
-    
-    top_congestion_df = pd.DataFrame(station_max_congestion)
-    top_congestion_df = top_congestion_df.nlargest(10, '최대 혼잡도')
+    # 히트맵의 상위 20개(최대 혼잡도 내림차순)에서 앞 10개만 사용 - 10개 행으로만 표를 만듦
+    top10_idx = top_idx[:10]
+    top10_rows = filtered_df.iloc[top10_idx]
+    
+    top_congestion_df = pd.DataFrame({
+        '운영기관': top10_rows[info_columns[0]].to_numpy(),
+        '호선': top10_rows[info_columns[1]].to_numpy(),
+        '역명': top10_rows[info_columns[3]].to_numpy(),
+        '요일구분': top10_rows[info_columns[4]].to_numpy(),
+        '최대 혼잡도': row_max[top10_idx],
+        '최대 혼잡 시간': np.asarray(time_columns)[row_argmax[top10_idx]]
+    })
     
     st.dataframe(
         top_congestion_df.style.format({'최대 혼잡도': '{:.1f}%'}),
@@ -415,8 +467,15 @@ def render_main_dashboard(df, time_columns, info_columns):
     with st.expander("📋 원본 데이터 보기"):
         st.dataframe(filtered_df, width='stretch')
 
-def render_commute_analysis(df, time_columns, info_columns):
+def render_commute_analysis(data):
     """나의 출퇴근 시간 맞춤 분석"""
+    import plotly.graph_objects as go
+    
+    # 전처리 결과에서 사용하는 값
+    df, time_columns, info_columns = data.df, data.time_columns, data.info_columns
+    time_matrix, row_index, time_idx = data.time_matrix, data.row_index, data.time_idx
+    uniques = data.uniques
+    
     st.header("🎯 나의 출퇴근 시간 맞춤 분석")
     st.markdown("출발역과 도착역, 출근 시간을 입력하면 최적의 이동 시간을 추천해드립니다!")
     
@@ -426,13 +485,13 @@ def render_commute_analysis(df, time_columns, info_columns):
         st.subheader("📍 출근 경로 설정")
         
         # 역 목록
-        stations = sorted(df[info_columns[3]].unique())
+        stations = uniques[info_columns[3]]
         
         departure = st.selectbox("출발역", stations, key="departure")
         arrival = st.selectbox("도착역", stations, key="arrival")
         
         # 요일 선택
-        day_type = st.radio("요일", df[info_columns[4]].unique(), horizontal=True)
+        day_type = st.radio("요일", df[info_columns[4]].cat.categories.tolist(), horizontal=True)
         
         # 시간 선택
         commute_time = st.selectbox("출근 시간", time_columns, index=8)  # 기본값: 8시30분
@@ -440,19 +499,21 @@ def render_commute_analysis(df, time_columns, info_columns):
     with col2:
         st.subheader("📊 혼잡도 분석 결과")
         
-        # 출발역 데이터
-        dep_data = df[(df[info_columns[3]] == departure) & (df[info_columns[4]] == day_type)]
-        arr_data = df[(df[info_columns[3]] == arrival) & (df[info_columns[4]] == day_type)]
+        # 출발역/도착역 행 번호
+        dep_row = row_index.get((departure, day_type))
+        arr_row = row_index.get((arrival, day_type))
         
-        if len(dep_data) > 0 and len(arr_data) > 0:
-            dep_congestion = dep_data.iloc[0][commute_time]
-            arr_congestion = arr_data.iloc[0][commute_time]
+        if dep_row is not None and arr_row is not None:
+            commute_idx = time_idx[commute_time]
+            dep_congestion = time_matrix[dep_row, commute_idx]
+            arr_congestion = time_matrix[arr_row, commute_idx]
+            commute_avg = np.nanmean(time_matrix[:, commute_idx])
             
             # 혼잡도 표시
             st.metric("출발역 혼잡도", f"{dep_congestion:.1f}%", 
-                     delta=f"{dep_congestion - df[commute_time].mean():.1f}%p")
+                     delta=f"{dep_congestion - commute_avg:.1f}%p")
             st.metric("도착역 혼잡도", f"{arr_congestion:.1f}%",
-                     delta=f"{arr_congestion - df[commute_time].mean():.1f}%p")
+                     delta=f"{arr_congestion - commute_avg:.1f}%p")
             
             # 혼잡도 평가
             avg_congestion = (dep_congestion + arr_congestion) / 2
@@ -471,8 +532,8 @@ def render_commute_analysis(df, time_columns, info_columns):
     # 시간대별 혼잡도 추이
     st.subheader("⏰ 시간대별 혼잡도 추이")
     
-    dep_series = dep_data.iloc[0][time_columns]
-    arr_series = arr_data.iloc[0][time_columns]
+    dep_series = time_matrix[dep_row]
+    arr_series = time_matrix[arr_row]
     
     fig = go.Figure()
     fig.add_trace(go.Scatter(
@@ -521,28 +582,38 @@ def render_commute_analysis(df, time_columns, info_columns):
     # 더 나은 시간대 추천
     st.subheader("💡 더 쾌적한 출근 시간 추천")
     
-    better_times_dep = find_better_times(dep_data.iloc[0], time_columns, commute_time, threshold=10)
+    better_times_dep = find_better_times(dep_series, time_columns, commute_idx, threshold=10)
+    n_better = len(better_times_dep[0])
     
-    if better_times_dep:
-        st.success(f"💡 더 쾌적한 시간대가 {len(better_times_dep)}개 있습니다!")
+    if n_better:
+        st.success(f"💡 더 쾌적한 시간대가 {n_better}개 있습니다!")
         
-        cols = st.columns(min(3, len(better_times_dep)))
-        for i, time_info in enumerate(better_times_dep[:3]):
+        cols = st.columns(min(3, n_better))
+        for i, (time_label, congestion, diff, time_diff) in enumerate(zip(*better_times_dep)):
+            if i >= 3:
+                break
             with cols[i]:
-                time_diff_min = abs(time_info['시간차'])
-                direction = "일찍" if time_info['시간차'] < 0 else "늦게"
+                time_diff_min = abs(int(time_diff))
+                direction = "일찍" if time_diff < 0 else "늦게"
                 
                 st.info(f"""
-                **{time_info['시간']}**  
+                **{time_label}**  
                 {time_diff_min}분 {direction}  
-                혼잡도: {time_info['혼잡도']:.1f}%  
-                🔽 {time_info['차이']:.1f}%p 감소
+                혼잡도: {congestion:.1f}%  
+                🔽 {diff:.1f}%p 감소
                 """)
     else:
         st.info("선택하신 시간이 이미 최적의 시간대입니다! 👍")
 
-def render_station_comparison(df, time_columns, info_columns):
+def render_station_comparison(data):
     """역 비교 기능"""
+    import plotly.graph_objects as go
+    
+    # 전처리 결과에서 사용하는 값
+    df, time_columns, info_columns = data.df, data.time_columns, data.info_columns
+    time_matrix, row_index, time_idx = data.time_matrix, data.row_index, data.time_idx
+    uniques = data.uniques
+    
     st.header("⚖️ 역 비교 분석")
     st.markdown("여러 역의 혼잡도를 동시에 비교해보세요!")
     
@@ -551,7 +622,7 @@ def render_station_comparison(df, time_columns, info_columns):
     with col1:
         st.subheader("🔍 비교할 역 선택")
         
-        stations = sorted(df[info_columns[3]].unique())
+        stations = uniques[info_columns[3]]
         
         # 다중 선택
         selected_stations = st.multiselect(
@@ -562,7 +633,8 @@ def render_station_comparison(df, time_columns, info_columns):
         )
         
         # 요일 선택
-        day_type = st.radio("요일 구분", df[info_columns[4]].unique(), key="compare_day", horizontal=True)
+        day_type = st.radio("요일 구분", df[info_columns[4]].cat.categories.tolist(), key="compare_day",
+                            horizontal=True)
         
         # 특정 시간대 선택
         selected_time = st.selectbox("특정 시간대", ["전체"] + time_columns, key="compare_time")
@@ -574,48 +646,54 @@ def render_station_comparison(df, time_columns, info_columns):
         
         st.subheader("📊 혼잡도 비교 결과")
         
+        # 데이터가 있는 역들의 행을 한 번에 모음 (선택 순서 유지)
+        found = [i for i, station in enumerate(selected_stations) if (station, day_type) in row_index]
+        found_stations = [selected_stations[i] for i in found]
+        station_values = time_matrix[[row_index[(station, day_type)] for station in found_stations]]
+        
         # 선택한 시간대의 혼잡도 비교
         if selected_time != "전체":
-            comparison_data = []
-            for station in selected_stations:
-                station_data = df[(df[info_columns[3]] == station) & (df[info_columns[4]] == day_type)]
-                if len(station_data) > 0:
-                    congestion = station_data.iloc[0][selected_time]
-                    comparison_data.append({
-                        '역명': station,
-                        '혼잡도': congestion
-                    })
-            
-            if comparison_data:
-                comp_df = pd.DataFrame(comparison_data).sort_values('혼잡도')
+            if found_stations:
+                comp_df = pd.DataFrame({
+                    '역명': found_stations,
+                    '혼잡도': station_values[:, time_idx[selected_time]]
+                }).sort_values('혼잡도')
                 
-                fig = px.bar(comp_df, x='역명', y='혼잡도',
-                            title=f'{selected_time} 혼잡도 비교',
-                            color='혼잡도',
-                            color_continuous_scale='RdYlGn_r')
-                fig.update_layout(height=400)
+                fig = go.Figure(go.Bar(
+                    x=comp_df['역명'],
+                    y=comp_df['혼잡도'],
+                    marker=dict(
+                        color=comp_df['혼잡도'],
+                        colorscale='RdYlGn_r',
+                        colorbar=dict(title='혼잡도')
+                    )
+                ))
+                fig.update_layout(
+                    title=f'{selected_time} 혼잡도 비교',
+                    xaxis_title='역명',
+                    yaxis_title='혼잡도',
+                    height=400
+                )
                 st.plotly_chart(fig, width='stretch')
     
     # 시간대별 비교 차트
     st.subheader("⏰ 시간대별 혼잡도 비교")
     
-    fig = go.Figure()
-    
     colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEAA7']
     
-    for i, station in enumerate(selected_stations):
-        station_data = df[(df[info_columns[3]] == station) & (df[info_columns[4]] == day_type)]
-        if len(station_data) > 0:
-            congestion_values = station_data.iloc[0][time_columns]
-            fig.add_trace(go.Scatter(
-                x=time_columns,
-                y=congestion_values,
-                mode='lines+markers',
-                name=station,
-                line=dict(color=colors[i % len(colors)], width=2)
-            ))
+    # 트레이스를 모아 Figure 생성 시 한 번에 검증
+    traces = [
+        go.Scatter(
+            x=time_columns,
+            y=congestion_values,
+            mode='lines+markers',
+            name=station,
+            line=dict(color=colors[i % len(colors)], width=2)
+        )
+        for i, station, congestion_values in zip(found, found_stations, station_values)
+    ]
     
-    fig.update_layout(
+    fig = go.Figure(data=traces, layout=go.Layout(
         title='선택한 역들의 시간대별 혼잡도 추이',
         xaxis_title='시간',
         yaxis_title='혼잡도 (%)',
@@ -623,32 +701,34 @@ def render_station_comparison(df, time_columns, info_columns):
         height=500,
         xaxis_tickangle=-45,
         legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-    )
+    ))
     
     st.plotly_chart(fig, width='stretch')
     
     # 통계 테이블
     st.subheader("📋 상세 통계")
     
-    stats_data = []
-    for station in selected_stations:
-        station_data = df[(df[info_columns[3]] == station) & (df[info_columns[4]] == day_type)]
-        if len(station_data) > 0:
-            congestion_series = station_data.iloc[0][time_columns]
-            stats_data.append({
-                '역명': station,
-                '평균 혼잡도': f"{congestion_series.mean():.1f}%",
-                '최대 혼잡도': f"{congestion_series.max():.1f}%",
-                '최소 혼잡도': f"{congestion_series.min():.1f}%",
-                '가장 혼잡한 시간': congestion_series.idxmax(),
-                '가장 한가한 시간': congestion_series.idxmin()
-            })
-    
-    stats_df = pd.DataFrame(stats_data)
+    # 빈 칸(NaN)은 제외하고 계산 (기존 Series.mean/max/idxmax 등과 동일)
+    time_labels = np.asarray(time_columns)
+    stats_df = pd.DataFrame({
+        '역명': found_stations,
+        '평균 혼잡도': [f"{v:.1f}%" for v in np.nanmean(station_values, axis=1)],
+        '최대 혼잡도': [f"{v:.1f}%" for v in np.nanmax(station_values, axis=1)],
+        '최소 혼잡도': [f"{v:.1f}%" for v in np.nanmin(station_values, axis=1)],
+        '가장 혼잡한 시간': time_labels[np.nanargmax(station_values, axis=1)],
+        '가장 한가한 시간': time_labels[np.nanargmin(station_values, axis=1)]
+    })
     st.dataframe(stats_df, width='stretch', hide_index=True)
 
-def render_best_time_now(df, time_columns, info_columns):
+def render_best_time_now(data):
     """지금 타기 좋은 시간 가이드"""
+    import plotly.graph_objects as go
+    
+    # 전처리 결과에서 사용하는 값
+    df, time_columns, info_columns = data.df, data.time_columns, data.info_columns
+    time_matrix, row_index, time_idx = data.time_matrix, data.row_index, data.time_idx
+    time_minutes, uniques = data.time_minutes, data.uniques
+    
     st.header("🕐 지금 타기 좋은 시간")
     
     # 현재 시간 표시
@@ -656,33 +736,34 @@ def render_best_time_now(df, time_columns, info_columns):
     st.info(f"⏰ 현재 시간: **{now.strftime('%Y-%m-%d %H:%M')}**")
     
     # 현재 시간대 찾기
-    current_time_slot = get_current_time_slot(time_columns)
+    current_time_slot = get_current_time_slot(time_columns, time_minutes)
     
     col1, col2 = st.columns([1, 2])
     
     with col1:
         st.subheader("🔍 역 선택")
         
-        stations = sorted(df[info_columns[3]].unique())
+        stations = uniques[info_columns[3]]
         selected_station = st.selectbox("역명", stations, key="now_station")
         
         # 요일 자동 감지
         weekday = now.weekday()
         auto_day = "평일" if weekday < 5 else "주말"
         
-        day_type = st.radio("요일", df[info_columns[4]].unique(), 
-                           index=list(df[info_columns[4]].unique()).index(auto_day) 
-                           if auto_day in df[info_columns[4]].unique() else 0,
+        day_options = df[info_columns[4]].cat.categories.tolist()
+        day_type = st.radio("요일", day_options, 
+                           index=day_options.index(auto_day) if auto_day in day_options else 0,
                            key="now_day", horizontal=True)
     
     with col2:
         st.subheader("📊 현재 혼잡도")
         
-        station_data = df[(df[info_columns[3]] == selected_station) & (df[info_columns[4]] == day_type)]
+        station_row = row_index.get((selected_station, day_type))
         
-        if len(station_data) > 0:
-            current_congestion = station_data.iloc[0][current_time_slot]
-            avg_congestion = station_data.iloc[0][time_columns].mean()
+        if station_row is not None:
+            station_vec = time_matrix[station_row]
+            current_congestion = station_vec[time_idx[current_time_slot]]
+            avg_congestion = np.nanmean(station_vec)
             
             col_a, col_b = st.columns(2)
             with col_a:
@@ -709,22 +790,17 @@ def render_best_time_now(df, time_columns, info_columns):
     # 향후 혼잡도 예측
     st.subheader("🔮 향후 혼잡도 변화")
     
-    current_idx = time_columns.index(current_time_slot)
-    
-    # 전체 시간대와 혼잡도
-    all_congestions = [station_data.iloc[0][t] for t in time_columns]
-    
-    fig = go.Figure()
+    current_idx = time_idx[current_time_slot]
     
+    traces = []
     past_times = []  # 초기화
     
     # 과거 데이터 (회색)
     if current_idx > 0:
-        past_indices = list(range(max(0, current_idx - 4), current_idx + 1))
-        past_times = [time_columns[i] for i in past_indices]
-        past_congestions = [all_congestions[i] for i in past_indices]
-        fig.add_trace(go.Scatter(
-            x=past_times, y=past_congestions,
+        past_start = max(0, current_idx - 4)
+        past_times = time_columns[past_start:current_idx + 1]
+        traces.append(go.Scatter(
+            x=past_times, y=station_vec[past_start:current_idx + 1],
             mode='lines+markers',
             name='과거',
             line=dict(color='lightgray', width=2),
@@ -732,18 +808,26 @@ def render_best_time_now(df, time_columns, info_columns):
         ))
     
     # 미래 예측 (파란색)
-    future_indices = list(range(current_idx, min(current_idx + 6, len(time_columns))))
-    future_times = [time_columns[i] for i in future_indices]
-    future_congestions = [all_congestions[i] for i in future_indices]
+    future_end = min(current_idx + 6, len(time_columns))
+    future_times = time_columns[current_idx:future_end]
     
-    fig.add_trace(go.Scatter(
-        x=future_times, y=future_congestions,
+    traces.append(go.Scatter(
+        x=future_times, y=station_vec[current_idx:future_end],
         mode='lines+markers',
         name='예상',
         line=dict(color='#4ECDC4', width=3),
         marker=dict(size=10)
     ))
     
+    fig = go.Figure(data=traces, layout=go.Layout(
+        title=f'{selected_station}역 혼잡도 변화 추이',
+        xaxis_title='시간',
+        yaxis_title='혼잡도 (%)',
+        hovermode='x unified',
+        height=400,
+        xaxis_tickangle=-45
+    ))
+    
     # 현재 시간 표시
     # x축에서 현재 시간의 위치 찾기
     all_x_values = past_times + future_times
@@ -764,48 +848,48 @@ def render_best_time_now(df, time_columns, info_columns):
             font=dict(color="red", size=12, weight="bold")
         )
     
-    fig.update_layout(
-        title=f'{selected_station}역 혼잡도 변화 추이',
-        xaxis_title='시간',
-        yaxis_title='혼잡도 (%)',
-        hovermode='x unified',
-        height=400,
-        xaxis_tickangle=-45
-    )
-    
     st.plotly_chart(fig, width='stretch')
     
     # 추천 시간대
     st.subheader("💡 추천 시간대")
     
-    better_times = find_better_times(station_data.iloc[0], time_columns, current_time_slot, threshold=15)
+    better_times = find_better_times(station_vec, time_columns, current_idx, threshold=15)
     
-    if better_times:
+    if len(better_times[0]):
         cols = st.columns(3)
-        for i, time_info in enumerate(better_times[:3]):
+        for i, (time_label, congestion, diff, time_diff) in enumerate(zip(*better_times)):
+            if i >= 3:
+                break
             with cols[i]:
-                time_diff_min = abs(time_info['시간차'])
-                if time_info['시간차'] < 0:
+                time_diff_min = abs(int(time_diff))
+                if time_diff < 0:
                     direction = "⏪ 조금 전"
                     st.info(f"""
-                    **{time_info['시간']}**  
+                    **{time_label}**  
                     {time_diff_min}분 전  
-                    혼잡도: {time_info['혼잡도']:.1f}%  
-                    🔽 {time_info['차이']:.1f}%p 감소
+                    혼잡도: {congestion:.1f}%  
+                    🔽 {diff:.1f}%p 감소
                     """)
                 else:
                     direction = "⏩ 조금 후"
                     st.success(f"""
-                    **{time_info['시간']}**  
+                    **{time_label}**  
                     {time_diff_min}분 후  
-                    혼잡도: {time_info['혼잡도']:.1f}%  
-                    🔽 {time_info['차이']:.1f}%p 감소
+                    혼잡도: {congestion:.1f}%  
+                    🔽 {diff:.1f}%p 감소
                     """)
     else:
         st.info("현재 시간이 최적의 시간대입니다! ✨")
 
-def render_direction_analysis(df, time_columns, info_columns):
+def render_direction_analysis(data):
     """상행선/하행선 방향별 분석"""
+    import plotly.graph_objects as go
+    
+    # 전처리 결과에서 사용하는 값
+    df, time_columns, info_columns = data.df, data.time_columns, data.info_columns
+    time_matrix, morning_idx, evening_idx = data.time_matrix, data.morning_idx, data.evening_idx
+    uniques = data.uniques
+    
     st.header("🔄 상행선/하행선 방향별 분석")
     st.markdown("상행선(도심 방향)과 하행선(외곽 방향)의 혼잡도 패턴을 비교합니다.")
     
@@ -837,14 +921,15 @@ def render_direction_analysis(df, time_columns, info_columns):
         st.subheader("🔍 분석 설정")
         
         # 호선 선택
-        lines = sorted(df[info_columns[1]].unique())
+        lines = uniques[info_columns[1]]
         selected_line = st.selectbox("호선", lines, key="direction_line")
         
         # 요일 선택
-        day_type = st.selectbox("요일", df[info_columns[4]].unique(), key="direction_day")
+        day_type = st.selectbox("요일", df[info_columns[4]].cat.categories.tolist(), key="direction_day")
         
         # 역 선택 (선택사항)
-        line_df = df[df[info_columns[1]] == selected_line]
+        line_mask = (df[info_columns[1]] == selected_line).to_numpy()
+        line_df = df[line_mask]
         stations_in_line = sorted(line_df[info_columns[3]].unique())
         
         selected_station = st.selectbox(
@@ -856,22 +941,22 @@ def render_direction_analysis(df, time_columns, info_columns):
     with col2:
         st.subheader("📊 출퇴근 시간대 혼잡도")
         
-        # 출퇴근 시간대 정의 (시간 형식이 '7시'이지 '07시'가 아님)
-        # startswith를 사용하거나 정확한 매칭 필요
-        morning_rush = [col for col in time_columns if 
-                       col.startswith('7시') or col.startswith('8시') or col.startswith('9시')]
-        evening_rush = [col for col in time_columns if 
-                       col.startswith('18시') or col.startswith('19시') or col.startswith('20시')]
-        
-        filtered_df = line_df[line_df[info_columns[4]] == day_type]
+        # 출퇴근 시간대 열 번호는 전처리 단계에서 미리 계산됨 (morning_idx, evening_idx)
+        line_day_mask = line_mask & (df[info_columns[4]] == day_type).to_numpy()
+        row_mask = line_day_mask
         
         if selected_station != "전체":
-            filtered_df = filtered_df[filtered_df[info_columns[3]] == selected_station]
+            row_mask = row_mask & (df[info_columns[3]] == selected_station).to_numpy()
+        
+        # 선택된 행의 혼잡도를 한 번만 꺼내고, 출퇴근 구간은 미리 계산한 열 번호로 위치 인덱싱
+        # (평균은 빈 칸(NaN)을 제외하고 계산)
+        row_ids = np.flatnonzero(row_mask)
+        row_vals = time_matrix[row_ids]
         
-        if len(filtered_df) > 0:
-            if morning_rush and evening_rush:
-                morning_avg = filtered_df[morning_rush].mean().mean()
-                evening_avg = filtered_df[evening_rush].mean().mean()
+        if len(row_ids) > 0:
+            if len(morning_idx) and len(evening_idx):
+                morning_avg = np.nanmean(row_vals[:, morning_idx])
+                evening_avg = np.nanmean(row_vals[:, evening_idx])
                 
                 col_a, col_b = st.columns(2)
                 with col_a:
@@ -897,21 +982,17 @@ def render_direction_analysis(df, time_columns, info_columns):
     # 시간대별 상세 분석
     st.subheader("⏰ 하루 전체 혼잡도 패턴")
     
-    # 호선별 평균 혼잡도
-    avg_by_time = []
-    for time_col in time_columns:
-        avg_by_time.append({
-            '시간': time_col,
-            '평균 혼잡도': filtered_df[time_col].mean()
-        })
-    
-    pattern_df = pd.DataFrame(avg_by_time)
+    # 호선별 평균 혼잡도 (전체 시간대를 한 번에 계산, 해당 행이 없으면 빈 그래프)
+    if len(row_ids) > 0:
+        avg_by_time = np.nanmean(row_vals, axis=0)
+    else:
+        avg_by_time = np.full(len(time_columns), np.nan, dtype=np.float32)
     
     fig = go.Figure()
     
     fig.add_trace(go.Scatter(
-        x=pattern_df['시간'],
-        y=pattern_df['평균 혼잡도'],
+        x=time_columns,
+        y=avg_by_time,
         mode='lines+markers',
         name='평균 혼잡도',
         line=dict(color='#FF6B6B', width=3),
@@ -920,46 +1001,43 @@ def render_direction_analysis(df, time_columns, info_columns):
     ))
     
     # 출퇴근 시간대 영역 표시
-    if morning_rush and evening_rush:  # 리스트가 비어있지 않은지 확인
-        try:
-            morning_start_idx = time_columns.index(morning_rush[0])
-            morning_end_idx = time_columns.index(morning_rush[-1])
-            evening_start_idx = time_columns.index(evening_rush[0])
-            evening_end_idx = time_columns.index(evening_rush[-1])
-            
-            fig.add_shape(
-                type="rect",
-                x0=morning_start_idx, x1=morning_end_idx,
-                y0=0, y1=1,
-                yref="paper",
-                fillcolor="yellow", opacity=0.2,
-                line=dict(width=0)
-            )
-            fig.add_annotation(
-                x=(morning_start_idx + morning_end_idx) / 2,
-                y=0.95, yref="paper",
-                text="출근시간",
-                showarrow=False,
-                font=dict(size=10)
-            )
-            
-            fig.add_shape(
-                type="rect",
-                x0=evening_start_idx, x1=evening_end_idx,
-                y0=0, y1=1,
-                yref="paper",
-                fillcolor="orange", opacity=0.2,
-                line=dict(width=0)
-            )
-            fig.add_annotation(
-                x=(evening_start_idx + evening_end_idx) / 2,
-                y=0.95, yref="paper",
-                text="퇴근시간",
-                showarrow=False,
-                font=dict(size=10)
-            )
-        except (ValueError, IndexError):
-            pass  # 시간대를 찾지 못한 경우 영역 표시 생략
+    if len(morning_idx) and len(evening_idx):  # 배열이 비어있지 않은지 확인
+        morning_start_idx = int(morning_idx[0])
+        morning_end_idx = int(morning_idx[-1])
+        evening_start_idx = int(evening_idx[0])
+        evening_end_idx = int(evening_idx[-1])
+        
+        fig.add_shape(
+            type="rect",
+            x0=morning_start_idx, x1=morning_end_idx,
+            y0=0, y1=1,
+            yref="paper",
+            fillcolor="yellow", opacity=0.2,
+            line=dict(width=0)
+        )
+        fig.add_annotation(
+            x=(morning_start_idx + morning_end_idx) / 2,
+            y=0.95, yref="paper",
+            text="출근시간",
+            showarrow=False,
+            font=dict(size=10)
+        )
+        
+        fig.add_shape(
+            type="rect",
+            x0=evening_start_idx, x1=evening_end_idx,
+            y0=0, y1=1,
+            yref="paper",
+            fillcolor="orange", opacity=0.2,
+            line=dict(width=0)
+        )
+        fig.add_annotation(
+            x=(evening_start_idx + evening_end_idx) / 2,
+            y=0.95, yref="paper",
+            text="퇴근시간",
+            showarrow=False,
+            font=dict(size=10)
+        )
     
     fig.update_layout(
         title=f'{selected_line} 시간대별 혼잡도 패턴',
@@ -975,27 +1053,30 @@ def render_direction_analysis(df, time_columns, info_columns):
     # 역별 출퇴근 시간 혼잡도 비교
     st.subheader("🚉 역별 출퇴근 시간 혼잡도 비교")
     
-    station_comparison = []
-    if morning_rush and evening_rush:
-        for station in stations_in_line[:10]:  # 상위 10개 역
-            station_df = line_df[(line_df[info_columns[3]] == station) & 
-                                (line_df[info_columns[4]] == day_type)]
-            if len(station_df) > 0:
-                try:
-                    morning_cong = station_df[morning_rush].mean().mean()
-                    evening_cong = station_df[evening_rush].mean().mean()
-                    station_comparison.append({
-                        '역명': station,
-                        '출근시간': morning_cong,
-                        '퇴근시간': evening_cong,
-                        '차이': evening_cong - morning_cong
-                    })
-                except Exception:
-                    pass  # 데이터가 없는 경우 건너뛰기
-    
-    if station_comparison:
-        comp_df = pd.DataFrame(station_comparison)
+    comp_df = None
+    if len(morning_idx) and len(evening_idx):
+        # 역별로 한 번에 groupby해 시간대별 평균을 구한 뒤 출퇴근 구간 평균 (역마다 필터링하지 않음)
+        # 빈 칸(NaN)은 제외하고 계산 (기존 station_df[cols].mean().mean()과 동일)
+        line_day_rows = np.flatnonzero(line_day_mask)
+        station_keys = df[info_columns[3]].to_numpy()[line_day_rows]
+        morning_by_station = pd.DataFrame(
+            time_matrix[np.ix_(line_day_rows, morning_idx)]
+        ).groupby(station_keys, sort=False).mean()
+        evening_by_station = pd.DataFrame(
+            time_matrix[np.ix_(line_day_rows, evening_idx)]
+        ).groupby(station_keys, sort=False).mean()
+        agg = pd.DataFrame({
+            '출근시간': morning_by_station.mean(axis=1),
+            '퇴근시간': evening_by_station.mean(axis=1)
+        })
         
+        # 상위 10개 역 (해당 요일 데이터가 없는 역은 제외)
+        comp_df = agg.reindex(stations_in_line[:10]).dropna()
+        comp_df.index.name = '역명'
+        comp_df = comp_df.reset_index()
+        comp_df['차이'] = comp_df['퇴근시간'] - comp_df['출근시간']
+    
+    if comp_df is not None and len(comp_df) > 0:
         fig = go.Figure()
         fig.add_trace(go.Bar(
             x=comp_df['역명'],
@@ -4,44 +4,66 @@ ReportLab을 사용한 전문적인 보고서 생성
 """
 
 import io
+import functools
+import hashlib
+import threading
 from datetime import datetime
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.units import inch, cm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Flowable
+from reportlab.lib.utils import ImageReader
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT, TA_JUSTIFY
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
-import plotly.graph_objects as go
-import plotly.io as pio
+import matplotlib
+matplotlib.use('Agg')  # GUI 없는 백엔드 (차트 이미지 생성용)
+import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
 from io import BytesIO
 from PIL import Image as PILImage
 
-# 한글 폰트 등록 시도
-def register_korean_font():
-    """한글 폰트 등록"""
-    import os
-    import platform
-    
-    # 여러 경로에서 폰트 찾기
-    font_paths = [
-        # Windows
+# OS별 한글 폰트 후보 경로 (sys.platform 기준, 현재 OS에 있을 수 있는 경로만 확인)
+_FONT_CANDIDATES = {
+    'win32': [
         'C:/Windows/Fonts/malgun.ttf',
         'C:/Windows/Fonts/gulim.ttc',
-        # Linux (Ubuntu/Debian) - packages.txt로 설치된 경로
+    ],
+    # Linux (Ubuntu/Debian) - packages.txt로 설치된 경로
+    'linux': [
         '/usr/share/fonts/truetype/nanum/NanumGothic.ttf',
         '/usr/share/fonts/truetype/nanum/NanumBarunGothic.ttf',
         '/usr/share/fonts/truetype/nanum-gothic/NanumGothic.ttf',
-        # macOS
+    ],
+    'darwin': [
         '/Library/Fonts/NanumGothic.ttf',
         '/System/Library/Fonts/AppleGothic.ttf',
-        # 상대 경로
-        'NanumGothic.ttf',
-        'malgun.ttf',
-    ]
+    ],
+}
+
+# 상대 경로 (앱 폴더에 폰트 파일을 둔 경우) - 모든 OS에서 확인
+_LOCAL_FONT_PATHS = [
+    'NanumGothic.ttf',
+    'malgun.ttf',
+]
+
+# 한글 폰트 등록 시도
+@functools.lru_cache(maxsize=1)
+def register_korean_font():
+    """한글 폰트 등록 (결과는 프로세스 내에서 재사용)"""
+    import os
+    import sys
+    
+    # 이미 등록된 경우(모듈 재로드 등) 파일 탐색과 TTF 파싱 없이 바로 사용
+    registered = pdfmetrics.getRegisteredFontNames()
+    for font_name in ('KoreanFont', 'DejaVu'):
+        if font_name in registered:
+            return font_name
+    
+    # 현재 OS의 후보 경로와 상대 경로에서만 폰트 찾기
+    font_paths = _FONT_CANDIDATES.get(sys.platform, []) + _LOCAL_FONT_PATHS
     
     # 사용 가능한 폰트 찾기
     for font_path in font_paths:
@@ -67,8 +89,9 @@ def register_korean_font():
 
 KOREAN_FONT = register_korean_font()
 
+@functools.lru_cache(maxsize=1)
 def create_custom_styles():
-    """커스텀 스타일 생성"""
+    """커스텀 스타일 생성 (보고서마다 다시 만들지 않도록 캐시)"""
     styles = getSampleStyleSheet()
     
     # 제목 스타일
@@ -119,206 +142,217 @@ def create_custom_styles():
     
     return styles
 
-def save_plotly_chart(fig, width=700, height=400):
-    """Plotly 차트를 이미지로 변환 (Kaleido 대신 matplotlib 사용)"""
+def _figure_to_image(fig):
+    """Figure 캔버스의 RGBA 픽셀을 PNG 인코딩 없이 PIL 이미지로 복사"""
+    fig.canvas.draw()
+    # convert('RGB')에서 복사되므로 이후 Figure를 비워도 안전
+    return PILImage.frombuffer('RGBA', fig.canvas.get_width_height(), fig.canvas.buffer_rgba(),
+                               'raw', 'RGBA', 0, 1).convert('RGB')
+
+def render_chart_image(chart, width=700, height=400, fig=None):
+    """차트 데이터(time_series_data 등의 반환값)를 matplotlib으로 바로 그려 PIL 이미지로 반환
+    
+    PDF용 차트는 Plotly Figure를 거치지 않고(Kaleido 불필요), PNG 인코딩도 하지 않음
+    fig: 여러 차트에서 재사용할 matplotlib Figure (없으면 새로 만들고 닫음)
+    """
+    own_fig = fig is None
+    if own_fig:
+        fig = plt.figure(figsize=(width/100, height/100), dpi=100)
+    else:
+        fig.clear()
+        fig.set_size_inches(width/100, height/100)
+    
     try:
-        # Kaleido 대신 matplotlib으로 차트 생성
-        import matplotlib.pyplot as plt
-        import matplotlib
-        matplotlib.use('Agg')  # GUI 없는 백엔드
+        x = chart['x']
+        y = chart['y']
+        if len(y) == 0:
+            raise Exception("No data in chart")
         
-        # Plotly 데이터 추출
-        if hasattr(fig, 'data') and len(fig.data) > 0:
-            trace = fig.data[0]
-            x = trace.x
-            y = trace.y
-            
-            # matplotlib으로 그리기
-            plt.figure(figsize=(width/100, height/100), dpi=100)
-            plt.plot(x, y, color='#FF6B6B', linewidth=2, marker='o', markersize=4)
-            plt.fill_between(range(len(y)), y, alpha=0.2, color='#FF6B6B')
-            plt.xticks(rotation=45, ha='right', fontsize=6)
-            plt.yticks(fontsize=8)
-            plt.grid(True, alpha=0.3)
-            plt.tight_layout()
-            
-            # BytesIO로 저장
-            buffer = BytesIO()
-            plt.savefig(buffer, format='PNG', dpi=150, bbox_inches='tight')
-            plt.close()
-            buffer.seek(0)
-            return buffer
+        # matplotlib으로 그리기 (pyplot 상태 대신 Axes에 직접 그림)
+        ax = fig.add_subplot()
+        positions = range(len(y))
+        if chart['kind'] == 'bar':
+            ax.bar(positions, y, color=chart['colors'][:len(y)])
+            for pos, value in zip(positions, y):
+                ax.text(pos, value, f"{value:.1f}%", ha='center', va='bottom', fontsize=7)
         else:
-            raise Exception("No data in figure")
+            ax.plot(x, y, color=chart['colors'][0], linewidth=2, marker='o', markersize=4)
+            ax.fill_between(x, y, alpha=0.2, color=chart['colors'][0])
+        ax.set_xticks(positions, x, rotation=45, ha='right', fontsize=6)
+        ax.tick_params(axis='y', labelsize=8)
+        ax.grid(True, alpha=0.3)
+        fig.tight_layout()
+        
+        # PDF에 약 6인치 폭으로 들어가므로 dpi=100 캔버스 그대로 사용
+        return _figure_to_image(fig)
             
     except Exception as e:
         print(f"차트 저장 오류: {e}")
         # 텍스트로 대체 이미지 생성
-        import matplotlib.pyplot as plt
-        import matplotlib
-        matplotlib.use('Agg')
-        
-        fig, ax = plt.subplots(figsize=(width/100, height/100))
+        fig.clear()
+        ax = fig.add_subplot()
         ax.text(0.5, 0.5, 'Chart\n(Visualization)', 
                 ha='center', va='center', fontsize=20, color='gray')
         ax.set_xlim(0, 1)
         ax.set_ylim(0, 1)
         ax.axis('off')
-        
-        buffer = BytesIO()
-        plt.savefig(buffer, format='PNG', dpi=100, bbox_inches='tight')
-        plt.close()
-        buffer.seek(0)
-        return buffer
+        return _figure_to_image(fig)
+    
+    finally:
+        if own_fig:
+            plt.close(fig)
+        else:
+            fig.clear()
+
+class ChartImage(Flowable):
+    """PNG를 거치지 않고 PIL 이미지를 그대로 PDF에 그리는 Flowable (platypus Image는 파일만 받음)"""
+    
+    def __init__(self, image, width, height):
+        super().__init__()
+        self.image = image
+        self.drawWidth = width
+        self.drawHeight = height
+        self.hAlign = 'CENTER'
+    
+    def wrap(self, availWidth, availHeight):
+        return self.drawWidth, self.drawHeight
+    
+    def draw(self):
+        self.canv.drawImage(ImageReader(self.image), 0, 0, self.drawWidth, self.drawHeight)
 
 def extract_insights(df, time_columns, info_columns):
     """핵심 인사이트 추출"""
     insights = {}
     
+    # 혼잡도 행렬을 float32로 한 번만 꺼내 모든 집계에서 재사용 (읽는 메모리 양 절반)
+    time_vals = df[time_columns].to_numpy(dtype=np.float32, copy=False)
+    
+    # 시간대별 평균/최대 혼잡도 (한 번만 계산해서 인사이트와 차트에서 공유)
+    means = np.nanmean(time_vals, axis=0)
+    maxes = np.nanmax(time_vals, axis=0)
+    insights['col_means'] = pd.Series(means, index=time_columns)
+    insights['col_maxes'] = pd.Series(maxes, index=time_columns)
+    
+    # 이하 값은 모두 위 시간대별 배열에서 바로 계산 (데이터 전체를 다시 읽지 않음)
+    peak_idx = int(np.nanargmax(means))
+    off_peak_idx = int(np.nanargmin(means))
+    
     # 전체 평균 혼잡도
-    insights['avg_congestion'] = df[time_columns].mean().mean()
+    insights['avg_congestion'] = np.nanmean(means)
     
     # 최대 혼잡도
-    insights['max_congestion'] = df[time_columns].max().max()
+    insights['max_congestion'] = np.nanmax(maxes)
     
     # 가장 혼잡한 시간대
-    avg_by_time = df[time_columns].mean()
-    insights['peak_time'] = avg_by_time.idxmax()
-    insights['peak_value'] = avg_by_time.max()
+    insights['peak_time'] = time_columns[peak_idx]
+    insights['peak_value'] = means[peak_idx]
     
     # 가장 한가한 시간대
-    insights['off_peak_time'] = avg_by_time.idxmin()
-    insights['off_peak_value'] = avg_by_time.min()
-    
-    # 가장 혼잡한 역 TOP 5
-    station_max = []
-    for _, row in df.iterrows():
-        max_val = row[time_columns].max()
-        station_max.append({
-            'station': row[info_columns[3]],
-            'line': row[info_columns[1]],
-            'day': row[info_columns[4]],
-            'congestion': max_val,
-            'time': row[time_columns].idxmax()
-        })
-    
-    station_max_df = pd.DataFrame(station_max).nlargest(5, 'congestion')
-    insights['top_stations'] = station_max_df.to_dict('records')
-    
-    # 평일/주말 비교
-    day_types = df[info_columns[4]].unique()
-    if len(day_types) > 1:
-        day_comparison = {}
-        for day in day_types:
-            day_df = df[df[info_columns[4]] == day]
-            day_comparison[day] = day_df[time_columns].mean().mean()
-        insights['day_comparison'] = day_comparison
+    insights['off_peak_time'] = time_columns[off_peak_idx]
+    insights['off_peak_value'] = means[off_peak_idx]
+    
+    # 가장 혼잡한 역 TOP 5 (행별 최대값을 한 번에 계산한 뒤 상위 5개 행만 선택)
+    # 빈 칸(NaN)은 -inf로 채워 행별 최대값/시간대 계산에서 제외, 값이 하나도 없는 행은 후보에서 제외
+    filled = np.where(np.isnan(time_vals), -np.inf, time_vals)
+    row_max = filled.max(axis=1)
+    row_argmax = filled.argmax(axis=1)
+    valid_rows = np.flatnonzero(row_max > -np.inf)
+    # 안정 정렬로 동점은 앞 행 우선 (기존 nlargest(keep='first')와 동일)
+    top_idx = valid_rows[np.argsort(-row_max[valid_rows], kind='stable')[:5]]
+    
+    top_rows = df.iloc[top_idx]
+    top_times = np.asarray(time_columns)[row_argmax[top_idx]]
+    insights['top_stations'] = [
+        {
+            'station': station,
+            'line': line,
+            'day': day,
+            'congestion': congestion,
+            'time': time
+        }
+        for station, line, day, congestion, time in zip(
+            top_rows[info_columns[3]], top_rows[info_columns[1]], top_rows[info_columns[4]],
+            row_max[top_idx], top_times)
+    ]
+    
+    # 평일/주말 비교 (구분별 평균을 groupby 한 번으로 계산, 데이터 등장 순서 유지)
+    day_means = df.groupby(info_columns[4], sort=False, observed=True)[time_columns].mean()
+    if len(day_means) > 1:
+        insights['day_comparison'] = day_means.mean(axis=1).to_dict()
     
     return insights
 
-def create_time_series_chart(df, time_columns, title="시간대별 평균 혼잡도"):
-    """시간대별 추이 차트 생성"""
-    avg_by_time = [df[col].mean() for col in time_columns]
-    
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=time_columns,
-        y=avg_by_time,
-        mode='lines+markers',
-        line=dict(color='#FF6B6B', width=3),
-        marker=dict(size=6),
-        fill='tozeroy',
-        fillcolor='rgba(255, 107, 107, 0.2)'
-    ))
-    
-    # 폰트가 없을 경우 영문으로 표시
-    if KOREAN_FONT in ['Helvetica', 'DejaVu']:
-        title = "Average Congestion by Time"
-        xaxis_title = "Time"
-        yaxis_title = "Congestion (%)"
-    else:
-        xaxis_title = '시간대'
-        yaxis_title = '평균 혼잡도 (%)'
-    
-    fig.update_layout(
-        title=title,
-        xaxis_title=xaxis_title,
-        yaxis_title=yaxis_title,
-        xaxis_tickangle=-45,
-        height=400,
-        showlegend=False,
-        font=dict(family="Arial", size=10),
-        plot_bgcolor='white',
-        paper_bgcolor='white'
-    )
-    
-    fig.update_xaxes(showgrid=True, gridcolor='lightgray')
-    fig.update_yaxes(showgrid=True, gridcolor='lightgray')
-    
-    return fig
+def time_series_data(col_means, time_columns):
+    """시간대별 추이 차트 데이터 (col_means: extract_insights에서 계산한 시간대별 평균)"""
+    return {
+        'kind': 'line',
+        'x': list(time_columns),
+        'y': np.asarray(col_means),  # Series의 값 배열을 복사 없이 사용
+        'colors': ['#FF6B6B']
+    }
 
-def create_top_stations_chart(insights):
-    """TOP 5 혼잡 역 차트"""
+def top_stations_data(insights):
+    """TOP 5 혼잡 역 차트 데이터"""
     top_stations = insights['top_stations']
     
-    stations = [s['station'] for s in top_stations]
-    congestions = [s['congestion'] for s in top_stations]
-    
-    fig = go.Figure()
-    fig.add_trace(go.Bar(
-        x=stations,
-        y=congestions,
-        marker_color=['#FF6B6B', '#FF8787', '#FFA5A5', '#FFC3C3', '#FFE1E1'],
-        text=[f"{c:.1f}%" for c in congestions],
-        textposition='outside'
-    ))
-    
-    fig.update_layout(
-        title='가장 혼잡한 역 TOP 5',
-        xaxis_title='역명',
-        yaxis_title='최대 혼잡도 (%)',
-        height=400,
-        showlegend=False,
-        font=dict(family="Malgun Gothic, Arial", size=10),
-        plot_bgcolor='white',
-        paper_bgcolor='white'
-    )
-    
-    fig.update_xaxes(showgrid=False)
-    fig.update_yaxes(showgrid=True, gridcolor='lightgray')
-    
-    return fig
+    return {
+        'kind': 'bar',
+        'x': [s['station'] for s in top_stations],
+        'y': [s['congestion'] for s in top_stations],
+        'colors': ['#FF6B6B', '#FF8787', '#FFA5A5', '#FFC3C3', '#FFE1E1']
+    }
 
-def create_day_comparison_chart(insights):
-    """평일/주말 비교 차트"""
+def day_comparison_data(insights):
+    """평일/주말 비교 차트 데이터 (비교 데이터가 없으면 None)"""
     if 'day_comparison' not in insights:
         return None
     
     day_comparison = insights['day_comparison']
-    days = list(day_comparison.keys())
-    values = list(day_comparison.values())
-    
-    fig = go.Figure()
-    fig.add_trace(go.Bar(
-        x=days,
-        y=values,
-        marker_color=['#4ECDC4', '#FFD93D'],
-        text=[f"{v:.1f}%" for v in values],
-        textposition='outside'
-    ))
-    
-    fig.update_layout(
-        title='평일 vs 주말 평균 혼잡도',
-        xaxis_title='요일 구분',
-        yaxis_title='평균 혼잡도 (%)',
-        height=350,
-        showlegend=False,
-        font=dict(family="Malgun Gothic, Arial", size=10),
-        plot_bgcolor='white',
-        paper_bgcolor='white'
-    )
-    
-    return fig
+    return {
+        'kind': 'bar',
+        'x': list(day_comparison.keys()),
+        'y': list(day_comparison.values()),
+        'colors': ['#4ECDC4', '#FFD93D']
+    }
+
+# 같은 데이터로 보고서를 다시 만들 때 인사이트와 차트 이미지(PIL)를 재사용하기 위한 캐시
+# 키는 데이터 내용 지문이며 마지막 1개만 보관
+# Streamlit 세션(스레드)끼리 공유하므로 잠금 안에서 조회/생성 (같은 데이터를 동시에 두 번 그리지 않음)
+_REPORT_CACHE = {}
+_REPORT_CACHE_LOCK = threading.Lock()
+
+def _df_fingerprint(df, time_columns, info_columns):
+    """데이터 내용 기반 캐시 키 (id(df)는 다른 객체에 재사용될 수 있으므로 내용 해시 사용)"""
+    row_hashes = pd.util.hash_pandas_object(df[info_columns + time_columns], index=False)
+    digest = hashlib.sha1(row_hashes.to_numpy().tobytes()).hexdigest()
+    return tuple(time_columns), tuple(info_columns), digest
+
+def get_report_assets(df, time_columns, info_columns):
+    """인사이트와 차트 이미지 반환 (같은 데이터면 캐시된 결과 재사용)"""
+    key = _df_fingerprint(df, time_columns, info_columns)
+    with _REPORT_CACHE_LOCK:
+        entry = _REPORT_CACHE.get(key)
+        if entry is None:
+            insights = extract_insights(df, time_columns, info_columns)
+            
+            # PDF용 차트는 데이터에서 matplotlib으로 바로 그림 (Figure 하나를 비워가며 재사용)
+            charts = {}
+            fig = plt.figure(dpi=100)
+            try:
+                time_chart = time_series_data(insights['col_means'], time_columns)
+                charts['time'] = render_chart_image(time_chart, width=700, height=400, fig=fig)
+                top_chart = top_stations_data(insights)
+                charts['top'] = render_chart_image(top_chart, width=700, height=400, fig=fig)
+                day_chart = day_comparison_data(insights)
+                if day_chart:
+                    charts['day'] = render_chart_image(day_chart, width=600, height=350, fig=fig)
+            finally:
+                plt.close(fig)
+            
+            entry = (insights, charts)
+            _REPORT_CACHE.clear()
+            _REPORT_CACHE[key] = entry
+    return entry
 
 def generate_pdf_report(df, time_columns, info_columns, filename="subway_report.pdf"):
     """PDF 보고서 생성 메인 함수"""
@@ -352,19 +386,20 @@ def generate_pdf_report(df, time_columns, info_columns, filename="subway_report.
     story.append(subtitle)
     story.append(Spacer(1, 0.2*inch))
     
-    # 분석 범위
+    # 분석 범위 (역/호선 개수를 한 번의 nunique로 계산)
+    n_unique = df[[info_columns[1], info_columns[3]]].nunique()
     analysis_range = Paragraph(
         f"<font size=10>분석 대상: {len(df)}개 데이터 포인트<br/>"
-        f"역 개수: {df[info_columns[3]].nunique()}개<br/>"
-        f"호선 개수: {df[info_columns[1]].nunique()}개</font>",
+        f"역 개수: {n_unique[info_columns[3]]}개<br/>"
+        f"호선 개수: {n_unique[info_columns[1]]}개</font>",
         styles['CustomBody']
     )
     story.append(analysis_range)
     
     story.append(PageBreak())
     
-    # === 인사이트 추출 ===
-    insights = extract_insights(df, time_columns, info_columns)
+    # === 인사이트 추출 및 차트 이미지 생성 (캐시) ===
+    insights, charts = get_report_assets(df, time_columns, info_columns)
     
     # === 요약 (Executive Summary) ===
     story.append(Paragraph("1. 주요 발견사항", styles['CustomHeading']))
@@ -384,11 +419,8 @@ def generate_pdf_report(df, time_columns, info_columns, filename="subway_report.
     story.append(Paragraph("2. 시간대별 혼잡도 분석", styles['CustomHeading']))
     story.append(Spacer(1, 0.1*inch))
     
-    # 차트 생성 및 추가
-    time_chart = create_time_series_chart(df, time_columns)
-    chart_img = save_plotly_chart(time_chart, width=700, height=400)
-    
-    img = Image(chart_img, width=6*inch, height=3.5*inch)
+    # 차트 추가
+    img = ChartImage(charts['time'], width=6*inch, height=3.5*inch)
     story.append(img)
     story.append(Spacer(1, 0.3*inch))
     
@@ -407,23 +439,15 @@ def generate_pdf_report(df, time_columns, info_columns, filename="subway_report.
     story.append(Spacer(1, 0.1*inch))
     
     # 차트
-    top_chart = create_top_stations_chart(insights)
-    chart_img2 = save_plotly_chart(top_chart, width=700, height=400)
-    img2 = Image(chart_img2, width=6*inch, height=3.5*inch)
+    img2 = ChartImage(charts['top'], width=6*inch, height=3.5*inch)
     story.append(img2)
     story.append(Spacer(1, 0.3*inch))
     
     # 테이블
-    table_data = [['순위', '역명', '호선', '요일', '최대 혼잡도', '시간']]
-    for i, station in enumerate(insights['top_stations'], 1):
-        table_data.append([
-            str(i),
-            station['station'],
-            station['line'],
-            station['day'],
-            f"{station['congestion']:.1f}%",
-            station['time']
-        ])
+    table_data = [['순위', '역명', '호선', '요일', '최대 혼잡도', '시간']] + [
+        [f"{i}", s['station'], s['line'], s['day'], f"{s['congestion']:.1f}%", s['time']]
+        for i, s in enumerate(insights['top_stations'], 1)
+    ]
     
     table = Table(table_data, colWidths=[0.8*inch, 1.5*inch, 1*inch, 1*inch, 1.2*inch, 1.5*inch])
     table.setStyle(TableStyle([
@@ -449,10 +473,8 @@ def generate_pdf_report(df, time_columns, info_columns, filename="subway_report.
         story.append(Paragraph("4. 평일 vs 주말 비교", styles['CustomHeading']))
         story.append(Spacer(1, 0.1*inch))
         
-        day_chart = create_day_comparison_chart(insights)
-        if day_chart:
-            chart_img3 = save_plotly_chart(day_chart, width=600, height=350)
-            img3 = Image(chart_img3, width=5*inch, height=3*inch)
+        if 'day' in charts:
+            img3 = ChartImage(charts['day'], width=5*inch, height=3*inch)
             story.append(img3)
             story.append(Spacer(1, 0.3*inch))
         